@@ -0,0 +1,297 @@
+# src/parsing/ocr.py
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, List, Optional, Tuple
+
+import fitz
+
+from src.utils.config_manager import get_config, PROJECT_ROOT
+
+logger = logging.getLogger(__name__)
+
+POINTS_PER_SQUARE_INCH = 72 * 72
+
+
+class OcrEngine(ABC):
+    """Base class for OCR engines. Instances are pickled into worker processes."""
+
+    name = "base"
+
+    def cache_namespace(self) -> str:
+        """Identifies engine settings that change the output, so caches don't mix."""
+        return self.name
+
+    def is_available(self) -> bool:
+        """Checks whether the engine can run in this environment."""
+        return True
+
+    @abstractmethod
+    def ocr_image(self, png_bytes: bytes) -> str:
+        """Returns the text recognized in a PNG page image."""
+        pass
+
+
+class TesseractOcrEngine(OcrEngine):
+    """Runs local Tesseract through PyMuPDF's built-in OCR support."""
+
+    name = "tesseract"
+
+    def __init__(self, language: str = None, tessdata: str = None):
+        if language is None:
+            language = get_config("OCR_LANGUAGE", "eng")
+        if tessdata is None:
+            tessdata = get_config("TESSDATA_PREFIX")
+        self.language = language
+        self.tessdata = tessdata
+
+    def cache_namespace(self) -> str:
+        return f"{self.name}-{self.language}"
+
+    def is_available(self) -> bool:
+        if not self.tessdata:
+            try:
+                # Looks in the standard install locations when TESSDATA_PREFIX is unset
+                self.tessdata = fitz.get_tessdata() or None
+            except Exception as e:
+                logger.debug(f"Tesseract lookup failed: {e}")
+                self.tessdata = None
+        if not self.tessdata or not os.path.isdir(self.tessdata):
+            logger.warning("Tesseract-OCR not found (install it or set TESSDATA_PREFIX).")
+            return False
+        missing = [
+            lang for lang in self.language.split("+")
+            if not os.path.isfile(os.path.join(self.tessdata, f"{lang}.traineddata"))
+        ]
+        if missing:
+            logger.warning(f"Tesseract language data missing in {self.tessdata}: {', '.join(missing)}")
+            return False
+        return True
+
+    def ocr_image(self, png_bytes: bytes) -> str:
+        pixmap = fitz.Pixmap(png_bytes)
+        # Tesseract returns a one-page PDF with an invisible text layer over the image
+        pdf_bytes = pixmap.pdfocr_tobytes(language=self.language, tessdata=self.tessdata)
+        with fitz.open("pdf", pdf_bytes) as ocr_document:
+            return ocr_document[0].get_text("text", sort=True)
+
+
+class OcrCache:
+    """On-disk cache of OCR text keyed by the hash of the rendered page image."""
+
+    def __init__(self, path: str = None):
+        if path is None:
+            path = get_config("OCR_CACHE_DIR", "data/ocr_cache")
+        if not os.path.isabs(path):
+            path = os.path.join(PROJECT_ROOT, path)
+        self.path = path
+
+    def _entry_path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.path, namespace, key[:2], f"{key}.txt")
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        entry_path = self._entry_path(namespace, key)
+        try:
+            with open(entry_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Could not read OCR cache entry {entry_path}: {e}")
+            return None
+
+    def put(self, namespace: str, key: str, text: str) -> None:
+        entry_path = self._entry_path(namespace, key)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, entry_path) # Atomic, so concurrent ingests never see partial entries
+        except OSError as e:
+            logger.warning(f"Could not write OCR cache entry {entry_path}: {e}")
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+_default_engine: Optional[OcrEngine] = None
+_default_engine_checked = False
+_default_engine_lock = threading.Lock()
+
+
+def _get_executor() -> Tuple[ProcessPoolExecutor, int]:
+    """Returns the shared OCR process pool, kept separate from normal extraction."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None:
+            _executor_workers = max(1, int(get_config("OCR_MAX_WORKERS", min(2, os.cpu_count() or 1))))
+            logger.info(f"Starting OCR process pool with {_executor_workers} worker(s)")
+            # Spawn rather than fork: the pool starts mid-ingestion, when the parent
+            # may already hold threads and loaded models that must not be copied
+            _executor = ProcessPoolExecutor(
+                max_workers=_executor_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(shutdown_ocr_pool)
+        return _executor, _executor_workers
+
+
+def shutdown_ocr_pool() -> None:
+    """Shuts down the OCR process pool if it was started."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _reset_broken_executor(executor: ProcessPoolExecutor) -> None:
+    """Drops a pool whose worker crashed so the next call starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            logger.warning("OCR worker crashed; restarting the OCR process pool on next use.")
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _run_ocr(engine: OcrEngine, png_bytes: bytes) -> str:
+    # Top-level so it can be pickled into the worker processes
+    return engine.ocr_image(png_bytes)
+
+
+def get_default_ocr_engine() -> Optional[OcrEngine]:
+    """
+    Returns the OCR engine selected in config (only Tesseract is built in).
+
+    Availability is checked once per process. Returns None, after a single
+    warning, if the engine cannot run here.
+    """
+    global _default_engine, _default_engine_checked
+    with _default_engine_lock:
+        if not _default_engine_checked:
+            engine_name = get_config("OCR_ENGINE", TesseractOcrEngine.name)
+            if engine_name != TesseractOcrEngine.name:
+                logger.warning(f"Unknown OCR engine '{engine_name}', falling back to Tesseract.")
+            engine = TesseractOcrEngine()
+            if engine.is_available():
+                _default_engine = engine
+            else:
+                logger.warning("OCR fallback disabled: scanned pages will be indexed without text.")
+            _default_engine_checked = True
+        return _default_engine
+
+
+def page_needs_ocr(page: fitz.Page, text: str, density_threshold: float = None) -> bool:
+    """
+    Decides whether a page's text layer is too sparse to trust.
+
+    Density is measured in non-whitespace characters per square inch of page
+    area. Full text pages run at roughly 30 or more; the default of 3 (about
+    290 characters on a Letter or A4 page) still sends a scan whose text layer
+    holds only a page number or a one- or two-line stamp to OCR.
+    """
+    if density_threshold is None:
+        density_threshold = float(get_config("OCR_TEXT_DENSITY_THRESHOLD", 3.0))
+    area = page.rect.width * page.rect.height / POINTS_PER_SQUARE_INCH
+    if area <= 0:
+        return False
+    char_count = sum(1 for c in text if not c.isspace())
+    return char_count / area < density_threshold
+
+
+def ocr_pages(
+    document: fitz.Document,
+    page_nums: List[int],
+    engine: OcrEngine = None,
+    cache: OcrCache = None,
+    dpi: int = None,
+) -> Dict[int, str]:
+    """
+    OCRs the given pages of an open document, using the cache where possible.
+
+    Pages are rendered in this process and handed to the OCR pool, with at
+    most two jobs per worker in flight so large scans don't pile rendered
+    images up in memory.
+
+    Args:
+        document: The open PyMuPDF document.
+        page_nums: Page numbers (0-indexed) to OCR.
+        engine: The OCR engine to use. Uses the configured default if None.
+        cache: The OCR result cache. Reads location from config if None.
+        dpi: Render resolution for the page images. Reads from config if None.
+
+    Returns:
+        A dictionary mapping page number to OCR text. Pages whose OCR
+        failed are left out; if a worker crashes, the pages recognized so
+        far are still returned and the pool is restarted on the next call.
+    """
+    if not page_nums:
+        return {}
+    if engine is None:
+        engine = get_default_ocr_engine()
+        if engine is None:
+            return {}
+    if cache is None:
+        cache = OcrCache()
+    if dpi is None:
+        dpi = int(get_config("OCR_DPI", 300))
+
+    namespace = engine.cache_namespace()
+    results: Dict[int, str] = {}
+    pending: Deque[Tuple[int, str, Future]] = deque()
+    cache_hits = 0
+    pool_broken = False
+
+    executor, max_workers = _get_executor()
+
+    def collect(page_num: int, key: str, future: Future) -> None:
+        nonlocal pool_broken
+        try:
+            text = future.result()
+        except BrokenProcessPool as e:
+            logger.warning(f"OCR failed for page {page_num + 1}: {e}")
+            pool_broken = True
+            _reset_broken_executor(executor)
+            return
+        except Exception as e:
+            logger.warning(f"OCR failed for page {page_num + 1}: {e}")
+            return
+        cache.put(namespace, key, text)
+        results[page_num] = text
+
+    for page_num in page_nums:
+        png_bytes = document.load_page(page_num).get_pixmap(dpi=dpi).tobytes("png")
+        key = hashlib.sha256(png_bytes).hexdigest()
+        cached_text = cache.get(namespace, key)
+        if cached_text is not None:
+            results[page_num] = cached_text
+            cache_hits += 1
+            continue
+
+        if len(pending) >= max_workers * 2:
+            collect(*pending.popleft())
+        if pool_broken:
+            # Still serve cached pages, but don't feed the rest of this document to a dead pool
+            continue
+        try:
+            pending.append((page_num, key, executor.submit(_run_ocr, engine, png_bytes)))
+        except BrokenProcessPool as e:
+            logger.warning(f"OCR failed for page {page_num + 1}: {e}")
+            pool_broken = True
+            _reset_broken_executor(executor)
+
+    while pending:
+        collect(*pending.popleft())
+
+    logger.info(f"OCR finished for {len(page_nums)} page(s): {cache_hits} from cache, {len(results) - cache_hits} newly recognized")
+    return results
@@ -3,22 +3,35 @@ import logging
 from typing import Dict, List
 
 from src.data_ingestion.data_source import DocumentSource
+from src.parsing.ocr import get_default_ocr_engine, ocr_pages, page_needs_ocr
+from src.utils.config_manager import get_config
 
 logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf(doc_source: DocumentSource) -> Dict[int, str]:
+def extract_text_from_pdf(doc_source: DocumentSource, ocr_fallback: bool = None) -> Dict[int, str]:
     """
     Extracts plain text from each page of a PDF document.
 
+    Pages whose text layer falls under the configured density threshold
+    (typically scans) are sent through OCR when the fallback is enabled.
+
     Args:
         doc_source: The DocumentSource object containing the path to the PDF.
+        ocr_fallback: Whether to OCR sparse pages. Reads from config if None.
 
     Returns:
         A dictionary where keys are page numbers (0-indexed) and
         values are the extracted text content of that page.
         Returns an empty dictionary if extraction fails.
     """
+    if ocr_fallback is None:
+        ocr_fallback = get_config("OCR_ENABLED", "true").lower() in ("1", "true", "yes")
+    ocr_engine = get_default_ocr_engine() if ocr_fallback else None
+    if ocr_engine is None:
+        ocr_fallback = False
+
     pages_text = {}
+    sparse_pages: List[int] = []
     try:
         logger.info(f"Opening PDF for text extraction: {doc_source.path}")
         document = fitz.open(doc_source.path)
@@ -28,13 +41,29 @@ def extract_text_from_pdf(doc_source: DocumentSource) -> Dict[int, str]:
         for page_num in range(num_pages):
             page = document.load_page(page_num)
             text = page.get_text("text", sort=True) # Get text, try sorting blocks vertically
-            if not text.strip():
+            if ocr_fallback and page_needs_ocr(page, text):
+                sparse_pages.append(page_num)
+            elif not text.strip():
                 logger.warning(f"Page {page_num + 1} in {doc_source.filename} seems to have no extractable text.")
             pages_text[page_num] = text
             # Log progress periodically if needed for large documents
             # if (page_num + 1) % 50 == 0:
             #     logger.debug(f"Processed {page_num + 1}/{num_pages} pages...")
 
+        if sparse_pages:
+            logger.info(f"Running OCR on {len(sparse_pages)} sparse page(s) in {doc_source.filename}")
+            try:
+                ocr_text = ocr_pages(document, sparse_pages, engine=ocr_engine)
+            except Exception as e:
+                logger.exception(f"OCR fallback failed for {doc_source.filename}, keeping the original text layer: {e}")
+                ocr_text = {}
+            for page_num in sparse_pages:
+                # Keep the original text layer if OCR failed or found less than it
+                if len(ocr_text.get(page_num, "").strip()) > len(pages_text[page_num].strip()):
+                    pages_text[page_num] = ocr_text[page_num]
+                elif not pages_text[page_num].strip():
+                    logger.warning(f"Page {page_num + 1} in {doc_source.filename} has no text even after OCR.")
+
         document.close()
         logger.info(f"Finished text extraction for document ID: {doc_source.id}")
         return pages_text
@@ -0,0 +1,178 @@
+# tests/test_parsing.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+import pytest
+
+from src.data_ingestion.data_source import DocumentSource
+from src.parsing import ocr, text_extractor
+from src.parsing.ocr import OcrCache, OcrEngine, ocr_pages, page_needs_ocr
+from src.parsing.text_extractor import extract_text_from_pdf
+
+FULL_PAGE_TEXT = "The engagement letter confirms the scope of the audit. " * 40
+STAMP_TEXT = (
+    "CONFIDENTIAL - SUBJECT TO PROTECTIVE ORDER - Bates No. ABC-0001234\n"
+    "Received by Audit Dept. 2024-03-15, Ref. ENG-2024-0789"
+)
+
+
+class FixedTextEngine(OcrEngine):
+    """OCR engine stand-in that returns fixed text and counts its calls."""
+
+    name = "fixed"
+
+    def __init__(self, text: str = "Scanned confirmation text", fail: bool = False):
+        self.text = text
+        self.fail = fail
+        self.calls = 0
+
+    def ocr_image(self, png_bytes: bytes) -> str:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("OCR engine crashed")
+        return self.text
+
+
+class CrashingEngine(OcrEngine):
+    """OCR engine stand-in that kills its worker process, like a Tesseract segfault."""
+
+    name = "crashing"
+
+    def ocr_image(self, png_bytes: bytes) -> str:
+        os._exit(1)
+
+
+def _make_document(*page_texts: str) -> fitz.Document:
+    document = fitz.open()
+    for text in page_texts:
+        page = document.new_page()
+        if text:
+            page.insert_textbox(fitz.Rect(36, 36, page.rect.width - 36, page.rect.height - 36), text, fontsize=9)
+    return document
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    # Run OCR jobs in-process so tests can count engine calls
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(ocr, "_get_executor", lambda: (executor, 2))
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_page_needs_ocr_flags_page_number_only_page(monkeypatch):
+    monkeypatch.delenv("OCR_TEXT_DENSITY_THRESHOLD", raising=False)
+    document = _make_document("7", FULL_PAGE_TEXT)
+    sparse_page, full_page = document[0], document[1]
+
+    assert page_needs_ocr(sparse_page, sparse_page.get_text())
+    assert not page_needs_ocr(full_page, full_page.get_text())
+
+
+def test_page_needs_ocr_flags_stamp_only_page(monkeypatch):
+    monkeypatch.delenv("OCR_TEXT_DENSITY_THRESHOLD", raising=False)
+    stamp_page = _make_document(STAMP_TEXT)[0]
+    text = stamp_page.get_text()
+
+    assert sum(1 for c in text if not c.isspace()) > 90
+    assert page_needs_ocr(stamp_page, text)
+
+
+def test_ocr_engine_requires_ocr_image():
+    class HalfWrittenEngine(OcrEngine):
+        name = "half"
+
+    with pytest.raises(TypeError):
+        HalfWrittenEngine()
+
+
+def test_ocr_pages_uses_cache_on_second_call(tmp_path, thread_pool):
+    document = _make_document("")
+    cache = OcrCache(str(tmp_path))
+    engine = FixedTextEngine()
+
+    first = ocr_pages(document, [0], engine=engine, cache=cache, dpi=72)
+    second = ocr_pages(document, [0], engine=engine, cache=cache, dpi=72)
+
+    assert first == second == {0: "Scanned confirmation text"}
+    assert engine.calls == 1
+
+
+def test_ocr_pages_leaves_out_failed_pages(tmp_path, thread_pool):
+    document = _make_document("")
+    cache = OcrCache(str(tmp_path))
+
+    assert ocr_pages(document, [0], engine=FixedTextEngine(fail=True), cache=cache, dpi=72) == {}
+    # Failures are not cached, so a working engine still gets the page
+    assert ocr_pages(document, [0], engine=FixedTextEngine(), cache=cache, dpi=72) == {0: "Scanned confirmation text"}
+
+
+def test_ocr_pages_runs_in_process_pool(tmp_path):
+    document = _make_document("")
+    try:
+        result = ocr_pages(document, [0], engine=FixedTextEngine(), cache=OcrCache(str(tmp_path)), dpi=72)
+    finally:
+        ocr.shutdown_ocr_pool()
+
+    assert result == {0: "Scanned confirmation text"}
+
+
+def test_ocr_pages_recovers_after_worker_crash(tmp_path):
+    document = _make_document("")
+    cache = OcrCache(str(tmp_path))
+    try:
+        crashed = ocr_pages(document, [0], engine=CrashingEngine(), cache=cache, dpi=72)
+        recovered = ocr_pages(document, [0], engine=FixedTextEngine(), cache=cache, dpi=72)
+    finally:
+        ocr.shutdown_ocr_pool()
+
+    assert crashed == {}
+    assert recovered == {0: "Scanned confirmation text"}
+
+
+@pytest.fixture
+def sparse_pdf(tmp_path, monkeypatch):
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path / "ocr_cache"))
+    monkeypatch.delenv("OCR_TEXT_DENSITY_THRESHOLD", raising=False)
+    path = tmp_path / "scan.pdf"
+    _make_document("7", FULL_PAGE_TEXT).save(str(path))
+    return DocumentSource(path=str(path), id="scan")
+
+
+def test_extractor_replaces_text_layer_with_longer_ocr_text(sparse_pdf, monkeypatch, thread_pool):
+    engine = FixedTextEngine()
+    monkeypatch.setattr(text_extractor, "get_default_ocr_engine", lambda: engine)
+
+    pages_text = extract_text_from_pdf(sparse_pdf, ocr_fallback=True)
+
+    assert pages_text[0] == "Scanned confirmation text"
+    assert "engagement letter" in pages_text[1]
+    assert engine.calls == 1 # Only the sparse page is OCR'd
+
+
+def test_extractor_keeps_text_layer_when_ocr_text_is_shorter(sparse_pdf, monkeypatch, thread_pool):
+    monkeypatch.setattr(text_extractor, "get_default_ocr_engine", lambda: FixedTextEngine(text=""))
+
+    pages_text = extract_text_from_pdf(sparse_pdf, ocr_fallback=True)
+
+    assert pages_text[0].strip() == "7"
+
+
+def test_extractor_skips_ocr_when_fallback_disabled(sparse_pdf, monkeypatch, thread_pool):
+    engine = FixedTextEngine()
+    monkeypatch.setattr(text_extractor, "get_default_ocr_engine", lambda: engine)
+
+    pages_text = extract_text_from_pdf(sparse_pdf, ocr_fallback=False)
+
+    assert pages_text[0].strip() == "7"
+    assert engine.calls == 0
+
+
+def test_extractor_disables_ocr_when_engine_unavailable(sparse_pdf, monkeypatch):
+    monkeypatch.setattr(text_extractor, "get_default_ocr_engine", lambda: None)
+    monkeypatch.setattr(ocr, "_get_executor", lambda: pytest.fail("OCR pool should not be started"))
+
+    pages_text = extract_text_from_pdf(sparse_pdf, ocr_fallback=True)
+
+    assert pages_text[0].strip() == "7"